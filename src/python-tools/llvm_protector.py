@@ -1,87 +1,93 @@
 #!/usr/bin/env python3
+import io
+import re
 import sys
 
+# Instruction patterns, only tried on lines that pass a cheap substring test
+_ICMP_RE = re.compile(r'^[ \t]*(%[\w.]+)[ \t]*=[ \t]*icmp[ \t]+\w+[ \t]+(\S+)[ \t]+([^,\s]+),[ \t]*(\S+)')
+_BR_RE = re.compile(r'^[ \t]*br[ \t]+i1[ \t]+(%[\w.]+),[ \t]*label[ \t]+(%[\w.]+),[ \t]*label[ \t]+(%[\w.]+)')
+
+# Protection code is emitted from two fixed templates with a single write each:
+# the duplicate/verify compares right after the icmp, and the guarded branch
+# with its safe/fault blocks in place of the original 'br i1'
+_DUP_TMPL = "  %s = icmp eq %s %s, %s\n  %s = icmp eq i1 %s, %s\n"
+_GUARD_TMPL = ("  br i1 %s, label %%%s, label %%%s\n\n"
+               "%s:\n  br i1 %s, label %s, label %s\n\n"
+               "%s:\n  call void @abort()\n  unreachable\n\n")
+
 class LLVMProtector:
     def __init__(self):
         self.register_counter = 1000
         self.block_counter = 100
         
-    def parse_icmp(self, line):
-        if 'icmp' not in line:
-            return None
-        parts = line.split()
-        if len(parts) < 7:
-            return None
+    def parse_icmp(self, match, line):
         return {
-            'result': parts[0],
-            'type': parts[4],
-            'op1': parts[5].rstrip(','),
-            'op2': parts[6],
+            'result': match.group(1),
+            'type': match.group(2),
+            'op1': match.group(3),
+            'op2': match.group(4),
             'full_line': line.strip()
         }
     
     def process_file(self, input_file, output_file):
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
-        
-        output = []
+        out = io.StringIO()
+        write = out.write
         # Add abort declaration after the target triple
         added_abort = False
         
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            
-            # Add abort declaration after target triple
-            if 'target triple' in line and not added_abort:
-                output.append(line)
-                output.append('\ndeclare void @abort() noreturn\n\n')
-                added_abort = True
-                i += 1
-                continue
-            
-            icmp_info = self.parse_icmp(line)
+        with open(input_file, 'r', buffering=1 << 20) as f:
+            # icmp awaiting its 'br i1' (single forward pass, no re-scanning)
+            pending = None
             
-            if icmp_info:
-                output.append(line)
-                dup_reg = f"%dup_{self.register_counter}"
-                self.register_counter += 1
-                output.append(f"  {dup_reg} = icmp eq {icmp_info['type']} {icmp_info['op1']}, {icmp_info['op2']}\n")
-                
-                verify_reg = f"%verify_{self.register_counter}"
-                self.register_counter += 1
-                output.append(f"  {verify_reg} = icmp eq i1 {icmp_info['result']}, {dup_reg}\n")
-                
-                i += 1
-                while i < len(lines):
-                    if 'br i1' in lines[i] and icmp_info['result'] in lines[i]:
-                        br_parts = lines[i].split()
-                        true_label = br_parts[4].rstrip(',')
-                        false_label = br_parts[6]
+            for line in f:
+                if line.startswith('define') or line.startswith('}'):
+                    # A branch never tests an icmp from another function
+                    pending = None
+                if pending is not None:
+                    br = _BR_RE.match(line) if 'br i1' in line else None
+                    if br is not None and br.group(1) == pending['result']:
+                        _, true_label, false_label = br.groups()
                         
                         safe_label = f"safe_{self.block_counter}"
                         fault_label = f"fault_{self.block_counter}"
                         self.block_counter += 1
                         
-                        output.append(f"  br i1 {verify_reg}, label %{safe_label}, label %{fault_label}\n\n")
-                        output.append(f"{safe_label}:\n")
-                        output.append(f"  br i1 {icmp_info['result']}, label {true_label}, label {false_label}\n\n")
-                        output.append(f"{fault_label}:\n")
-                        output.append(f"  call void @abort()\n")
-                        output.append(f"  unreachable\n\n")
+                        write(_GUARD_TMPL % (pending['verify_reg'], safe_label, fault_label,
+                                             safe_label, pending['result'], true_label, false_label,
+                                             fault_label))
                         
-                        print(f"[+] Protected: {icmp_info['result']} -> {safe_label}/{fault_label}")
-                        i += 1
-                        break
+                        print(f"[+] Protected: {pending['result']} -> {safe_label}/{fault_label}")
+                        pending = None
                     else:
-                        output.append(lines[i])
-                        i += 1
-            else:
-                output.append(line)
-                i += 1
+                        write(line)
+                    continue
+                
+                # Add abort declaration after target triple
+                if 'target triple' in line and not added_abort:
+                    write(line)
+                    write('\ndeclare void @abort() noreturn\n\n')
+                    added_abort = True
+                    continue
+                
+                m = _ICMP_RE.match(line) if 'icmp' in line else None
+                
+                if m is not None:
+                    icmp_info = self.parse_icmp(m, line)
+                    write(line)
+                    dup_reg = f"%dup_{self.register_counter}"
+                    verify_reg = f"%verify_{self.register_counter + 1}"
+                    self.register_counter += 2
+                    write(_DUP_TMPL % (dup_reg, icmp_info['type'], icmp_info['op1'], icmp_info['op2'],
+                                       verify_reg, icmp_info['result'], dup_reg))
+                    
+                    icmp_info['dup_reg'] = dup_reg
+                    icmp_info['verify_reg'] = verify_reg
+                    pending = icmp_info
+                else:
+                    write(line)
         
         with open(output_file, 'w') as f:
-            f.writelines(output)
+            f.write(out.getvalue())
         
         print(f"\n[✓] Protected IR written to: {output_file}")
 
@@ -1,187 +1,335 @@
 #!/usr/bin/env python3
+import io
+import re
 import sys
 
+# Instruction patterns, only tried on lines that pass a cheap substring test
+_ICMP_RE = re.compile(r'^[ \t]*(%[\w.]+)[ \t]*=[ \t]*icmp[ \t]+\w+[ \t]+(\S+)[ \t]+([^,\s]+),[ \t]*(\S+)')
+_BR_RE = re.compile(r'^[ \t]*br[ \t]+i1[ \t]+(%[\w.]+),[ \t]*label[ \t]+(%[\w.]+),[ \t]*label[ \t]+(%[\w.]+)')
+
+# Anchored so that e.g. 'ret i32 10' or 'store i32 1234' is not taken for a 1
+_RET_RE = re.compile(r'^\s*ret\s+i32\s+(-?\d+)\s*(?:,|$)')
+_STORE_RE = re.compile(r'^\s*store\s+i32\s+(-?\d+),')
+_BRLBL_RE = re.compile(r'^\s*br\s+label\s+%([\w.]+)')
+
+# Instruction kinds kept per block by _prepare()
+KIND_RET1, KIND_RET0, KIND_STORE1, KIND_STORE0, KIND_BRANCH = range(5)
+_KIND_VALUE = {KIND_RET1: 1, KIND_RET0: 0, KIND_STORE1: 1, KIND_STORE0: 0}
+
+# Return-value lattice for propagate_returns(): None < 0, 1 < _RET_TOP
+_RET_TOP = object()
+
+def _join_return(a, b):
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    return _RET_TOP
+
+# Protection code is emitted from two fixed templates with a single write each:
+# the duplicate/verify compares right after the icmp, and the guarded branch
+# with its safe/fault blocks in place of the original 'br i1'
+_DUP_TMPL = "  %s = icmp eq %s %s, %s\n  %s = icmp eq i1 %s, %s\n"
+_GUARD_TMPL = ("  br i1 %s, label %%%s, label %%%s\n\n"
+               "%s:\n  br i1 %s, label %s, label %s\n\n"
+               "%s:\n  call void @abort()\n  unreachable\n\n")
+
 class LLVMProtector:
     def __init__(self):
         self.register_counter = 1000
         self.block_counter = 100
         self.comparisons = []
+        self._log = []
+        self.icmps = {}
+        self.branches = {}
+        self.br_by_icmp = {}
+        self.block_info = {}
+        self.block_return = {}
         
-    def parse_icmp(self, line):
-        if 'icmp' not in line:
-            return None
-        parts = line.split()
-        if len(parts) < 7:
-            return None
+    def parse_icmp(self, match, line):
+        parts = match.groups()
         return {
             'result': parts[0],
-            'type': parts[4],
-            'op1': parts[5].rstrip(','),
-            'op2': parts[6],
-            'full_line': line.strip()
+            'type': parts[1],
+            'op1': parts[2],
+            'op2': parts[3],
+            'full_line': line.strip(),
+            # Filled in when the protection is emitted
+            'dup_reg': None,
+            'verify_reg': None
         }
     
-    def build_block_map(self, lines):
-        """Build a dictionary mapping block labels to their instructions"""
-        blocks = {}
-        current_label = None
-        current_instructions = []
+    def _prepare(self, lines):
+        """Build every table scoring needs in one linear pass plus one CFG sweep
+        
+        Register names and block labels only mean something inside one
+        function, so everything is scoped per function. self.icmps and
+        self.branches hold parsed icmps and (condition, true, false) branch
+        tuples by line index; self.br_by_icmp maps an icmp's line to the line
+        of the first later branch in the same function that tests its result.
+        Blocks are reduced to a compact list of (kind, target) in
+        self.block_info, keyed by (function index, label), so raw lines are
+        not kept, and self.block_return holds each block's return constant.
+        """
+        icmps = {}
+        branches = {}
+        br_by_icmp = {}
+        block_info = {}
+        current_info = None
+        function = 0
+        # icmp result register -> its line, for icmps still waiting for a branch
+        awaiting_br = {}
         
-        for line in lines:
+        for i, line in enumerate(lines):
+            if line.startswith('define') or line.startswith('}'):
+                function += 1
+                awaiting_br.clear()
+                current_info = None
+            
+            if 'icmp' in line:
+                m = _ICMP_RE.match(line)
+                if m is not None:
+                    icmp_info = icmps[i] = self.parse_icmp(m, line)
+                    icmp_info['function'] = function
+                    awaiting_br[icmp_info['result']] = i
+            elif 'br i1' in line:
+                m = _BR_RE.match(line)
+                if m is not None:
+                    br = branches[i] = m.groups()
+                    icmp_line = awaiting_br.pop(br[0], None)
+                    if icmp_line is not None:
+                        br_by_icmp[icmp_line] = i
+            
             stripped = line.strip()
             if stripped and (stripped[0].isdigit() or 'safe_' in stripped or 'fault_' in stripped):
                 if ':' in stripped:
-                    if current_label:
-                        blocks[current_label] = current_instructions
-                    current_label = stripped.split(':')[0]
-                    current_instructions = []
-            elif current_label:
-                current_instructions.append(line)
-        
-        if current_label:
-            blocks[current_label] = current_instructions
-            
-        return blocks
-    
-    def find_return_value(self, label, blocks, visited=None):
-        """Find what value is returned from this path (1, 0, or None)"""
-        if visited is None:
-            visited = set()
+                    current_info = block_info[(function, stripped.split(':')[0])] = []
+            elif current_info is not None:
+                kind = self.classify_line(line)
+                if kind is not None:
+                    current_info.append(kind)
         
-        if label in visited:
+        self.icmps = icmps
+        self.branches = branches
+        self.br_by_icmp = br_by_icmp
+        self.block_info = block_info
+        self.block_return = self.propagate_returns()
+    
+    def classify_line(self, line):
+        """Return (kind, target) for a line that decides a block's return value, else None"""
+        m = _RET_RE.match(line)
+        if m is not None:
+            value = m.group(1)
+            if value == '1':
+                return KIND_RET1, None
+            if value == '0':
+                return KIND_RET0, None
             return None
-        visited.add(label)
-        
-        block_lines = blocks.get(label, [])
         
-        for line in block_lines:
-            # Check for direct return with constant
-            if 'ret i32 1' in line:
-                return 1
-            if 'ret i32 0' in line:
-                return 0
-            
-            # Check for stores to return variable
-            if 'store i32 1' in line:
-                return 1
-            if 'store i32 0' in line:
-                return 0
-                
-            # Follow branches
-            if 'br label' in line:
-                parts = line.split()
-                for part in parts:
-                    if part.startswith('%'):
-                        next_label = part.lstrip('%').rstrip(',')
-                        result = self.find_return_value(next_label, blocks, visited)
-                        if result is not None:
-                            return result
+        m = _STORE_RE.match(line)
+        if m is not None:
+            value = m.group(1)
+            if value == '1':
+                return KIND_STORE1, None
+            if value == '0':
+                return KIND_STORE0, None
+            return None
         
+        m = _BRLBL_RE.match(line)
+        if m is not None:
+            return KIND_BRANCH, m.group(1)
         return None
     
-    def score_comparison(self, cmp_result, lines, line_idx):
-        """Score based on whether branches lead to different return values"""
-        score = 0
-        blocks = self.build_block_map(lines)
-        
-        for i in range(line_idx + 1, min(line_idx + 5, len(lines))):
-            if 'br i1' in lines[i] and cmp_result in lines[i]:
-                parts = lines[i].split()
-                true_label = parts[4].lstrip('%').rstrip(',')
-                false_label = parts[6].lstrip('%').rstrip(',') if len(parts) > 6 else None
+    def block_exit(self, block):
+        """Return (value, successors) for a (function, label) block"""
+        for kind, target in self.block_info.get(block, ()):
+            if kind == KIND_BRANCH:
+                return None, ((block[0], target),)
+            return _KIND_VALUE[kind], ()
+        
+        return None, ()
+    
+    def propagate_returns(self):
+        """Resolve the return constant of every block in O(V+E), cycles included
+        
+        Blocks are grouped into strongly connected components by an iterative
+        Tarjan walk over 'br label' edges. Components come out successors
+        first, so each one's value is the join of its members' own constants
+        and the values of the components it branches to.
+        """
+        direct = {}
+        successors = {}
+        for label in self.block_info:
+            value, succs = self.block_exit(label)
+            direct[label] = value
+            successors[label] = [t for t in succs if t in self.block_info]
+        
+        block_return = {}
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        
+        for root in successors:
+            if root in index:
+                continue
+            # Each frame is (label, position of the next successor to visit)
+            work = [(root, 0)]
+            while work:
+                label, pos = work.pop()
+                if pos == 0:
+                    index[label] = lowlink[label] = len(index)
+                    stack.append(label)
+                    on_stack.add(label)
                 
-                true_ret = self.find_return_value(true_label, blocks)
-                false_ret = self.find_return_value(false_label, blocks) if false_label else None
+                succs = successors[label]
+                descended = False
+                while pos < len(succs):
+                    target = succs[pos]
+                    pos += 1
+                    if target not in index:
+                        work.append((label, pos))
+                        work.append((target, 0))
+                        descended = True
+                        break
+                    if target in on_stack:
+                        lowlink[label] = min(lowlink[label], index[target])
+                if descended:
+                    continue
                 
-                # Critical: branches lead to DIFFERENT returns (decision gate)
-                if true_ret is not None and false_ret is not None and true_ret != false_ret:
-                    score = 100
-                # Medium: at least one path returns
-                elif true_ret is not None or false_ret is not None:
-                    score = 30
+                if lowlink[label] == index[label]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == label:
+                            break
+                    value = None
+                    for member in members:
+                        value = _join_return(value, direct[member])
+                        for target in successors[member]:
+                            if target in block_return:
+                                value = _join_return(value, block_return[target])
+                    for member in members:
+                        block_return[member] = value
                 
-                break
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[label])
         
-        return score
+        # Paths that disagree have no single return constant
+        return {label: (None if value is _RET_TOP else value) for label, value in block_return.items()}
+    
+    def score_comparison(self, line_num):
+        """Score based on whether branches lead to different return values"""
+        br_line = self.br_by_icmp.get(line_num)
+        if br_line is None:
+            return 0
+        
+        function = self.icmps[line_num]['function']
+        _, true_label, false_label = self.branches[br_line]
+        true_ret = self.block_return.get((function, true_label[1:]))
+        false_ret = self.block_return.get((function, false_label[1:]))
+        
+        # Critical: branches lead to DIFFERENT returns (decision gate)
+        if true_ret is not None and false_ret is not None and true_ret != false_ret:
+            return 100
+        # Medium: at least one path returns
+        if true_ret is not None or false_ret is not None:
+            return 30
+        return 0
     
     def process_file(self, input_file, output_file, threshold=50):
-        with open(input_file, 'r') as f:
-            lines = f.readlines()
+        out = io.StringIO()
+        write = out.write
+        added_abort = False
         
-        comparisons_to_protect = []
-        for i, line in enumerate(lines):
-            icmp_info = self.parse_icmp(line)
-            if icmp_info:
-                score = self.score_comparison(icmp_info['result'], lines, i)
+        with open(input_file, 'r', buffering=1 << 20) as f:
+            # Pass 1: stream the file once to build the icmp, branch and block tables
+            self._prepare(f)
+            
+            comparisons_to_protect = []
+            for i, icmp_info in self.icmps.items():
+                score = self.score_comparison(i)
                 icmp_info['score'] = score
                 icmp_info['line_num'] = i
                 self.comparisons.append(icmp_info)
                 
-                if score >= threshold:
+                protect = score >= threshold
+                if protect:
                     comparisons_to_protect.append(icmp_info)
-                    print(f"[+] Will protect {icmp_info['result']} (score: {score})")
-                else:
-                    print(f"[-] Skipping {icmp_info['result']} (score: {score}, below threshold {threshold})")
-        
-        output = []
-        added_abort = False
-        protected_indices = {cmp['line_num'] for cmp in comparisons_to_protect}
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
+                # Reported in one write at the end instead of a print per comparison
+                self._log.append((protect, icmp_info['result'], score))
             
-            if 'target triple' in line and not added_abort:
-                output.append(line)
-                output.append('\ndeclare void @abort() noreturn\n\n')
-                added_abort = True
-                i += 1
-                continue
+            # comparisons_to_protect is in line order, so one pointer walks both lists
+            protected_line_nums = [cmp['line_num'] for cmp in comparisons_to_protect]
+            num_protected = len(protected_line_nums)
+            idx_ptr = 0
             
-            if i in protected_indices:
-                icmp_info = next(cmp for cmp in comparisons_to_protect if cmp['line_num'] == i)
-                
-                output.append(line)
-                dup_reg = f"%dup_{self.register_counter}"
-                self.register_counter += 1
-                
-                op1 = icmp_info['op1']
-                op2 = icmp_info['op2']
-                output.append(f"  {dup_reg} = icmp eq {icmp_info['type']} {op1}, {op2}\n")
-                
-                verify_reg = f"%verify_{self.register_counter}"
-                self.register_counter += 1
-                output.append(f"  {verify_reg} = icmp eq i1 {icmp_info['result']}, {dup_reg}\n")
-                
-                i += 1
-                while i < len(lines):
-                    if 'br i1' in lines[i] and icmp_info['result'] in lines[i]:
-                        br_parts = lines[i].split()
-                        true_label = br_parts[4].rstrip(',')
-                        false_label = br_parts[6]
+            # Pass 2: rewind and emit
+            f.seek(0)
+            
+            # Protected icmp awaiting its 'br i1' (single forward pass, no re-scanning)
+            pending = None
+            pending_br_line = None
+            
+            for i, line in enumerate(f):
+                if pending is not None:
+                    # A protected icmp met while another is pending is copied as-is
+                    if idx_ptr < num_protected and i == protected_line_nums[idx_ptr]:
+                        idx_ptr += 1
+                    if i == pending_br_line:
+                        _, true_label, false_label = self.branches[i]
                         
                         safe_label = f"safe_{self.block_counter}"
                         fault_label = f"fault_{self.block_counter}"
                         self.block_counter += 1
                         
-                        output.append(f"  br i1 {verify_reg}, label %{safe_label}, label %{fault_label}\n\n")
-                        output.append(f"{safe_label}:\n")
-                        output.append(f"  br i1 {icmp_info['result']}, label {true_label}, label {false_label}\n\n")
-                        output.append(f"{fault_label}:\n")
-                        output.append(f"  call void @abort()\n")
-                        output.append(f"  unreachable\n\n")
+                        write(_GUARD_TMPL % (pending['verify_reg'], safe_label, fault_label,
+                                             safe_label, pending['result'], true_label, false_label,
+                                             fault_label))
                         
-                        i += 1
-                        break
+                        pending = None
                     else:
-                        output.append(lines[i])
-                        i += 1
-            else:
-                output.append(line)
-                i += 1
+                        write(line)
+                    continue
+                
+                if 'target triple' in line and not added_abort:
+                    write(line)
+                    write('\ndeclare void @abort() noreturn\n\n')
+                    added_abort = True
+                    continue
+                
+                if idx_ptr < num_protected and i == protected_line_nums[idx_ptr]:
+                    icmp_info = comparisons_to_protect[idx_ptr]
+                    idx_ptr += 1
+                    
+                    write(line)
+                    dup_reg = f"%dup_{self.register_counter}"
+                    verify_reg = f"%verify_{self.register_counter + 1}"
+                    self.register_counter += 2
+                    write(_DUP_TMPL % (dup_reg, icmp_info['type'], icmp_info['op1'], icmp_info['op2'],
+                                       verify_reg, icmp_info['result'], dup_reg))
+                    
+                    icmp_info['dup_reg'] = dup_reg
+                    icmp_info['verify_reg'] = verify_reg
+                    # An icmp with no branch in its function keeps only the duplicate
+                    pending_br_line = self.br_by_icmp.get(i)
+                    if pending_br_line is not None:
+                        pending = icmp_info
+                else:
+                    write(line)
         
         with open(output_file, 'w') as f:
-            f.writelines(output)
+            f.write(out.getvalue())
+        
+        if self._log:
+            sys.stdout.write("\n".join(
+                f"[+] Will protect {result} (score: {score})" if protect
+                else f"[-] Skipping {result} (score: {score}, below threshold {threshold})"
+                for protect, result, score in self._log) + "\n")
+            self._log = []
         
         total = len(self.comparisons)
         protected = len(comparisons_to_protect)
@@ -3,9 +3,21 @@
 Verification Engine for Data-Flow Protection
 Verifies that protection code survives compiler optimizations
 """
+import contextlib
+import io
+import os
 import sys
 import subprocess
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+# IR is scanned as raw bytes. Abort calls are a plain literal; only the
+# numbered registers need a regex
+_ABORT_CALL = b'call void @abort'
+_DUP_RE = re.compile(rb'%dup_\d+')
+_VERIFY_RE = re.compile(rb'%verify_\d+')
+_COMMENT_LINE_RE = re.compile(rb'^[ \t\r\f\v]*;', re.M)
+_BLANK_LINE_RE = re.compile(rb'^[ \t\r\f\v]*\n', re.M)
 
 class ProtectionVerifier:
     def __init__(self):
@@ -19,37 +31,73 @@ class ProtectionVerifier:
             'duplicate_cmp_optimized': 0,
             'verification_passed': False
         }
+        self._file_cache = {}
+    
+    def _load(self, filename):
+        """Read an IR file once as bytes; later checks reuse the cached contents"""
+        content = self._file_cache.get(filename)
+        if content is None:
+            with open(filename, 'rb') as f:
+                content = f.read()
+            # Terminate the last line so every line ends in a newline
+            if content and not content.endswith(b'\n'):
+                content += b'\n'
+            self._file_cache[filename] = content
+        return content
     
-    def count_lines(self, filename):
+    def count_lines(self, content):
         """Count non-empty, non-comment lines"""
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-        return len([l for l in lines if l.strip() and not l.strip().startswith(';')])
+        total = content.count(b'\n')
+        comments = len(_COMMENT_LINE_RE.findall(content))
+        blanks = len(_BLANK_LINE_RE.findall(content))
+        return total - comments - blanks
     
-    def count_pattern(self, filename, pattern):
-        """Count occurrences of a pattern in file"""
-        with open(filename, 'r') as f:
-            content = f.read()
-        return len(re.findall(pattern, content))
+    def count_pattern(self, content, pattern, literal=None):
+        """Count occurrences of a pattern in IR bytes
+        
+        A bytes pattern is counted as a literal substring. For a compiled
+        pattern, `literal` is a prefix that every match contains, so files
+        without it are skipped before running the regex.
+        """
+        if isinstance(pattern, bytes):
+            return content.count(pattern)
+        if literal is not None and literal not in content:
+            return 0
+        return len(pattern.findall(content))
     
-    def verify_abort_present(self, filename):
+    def verify_abort_present(self, content):
         """Check if @abort() calls are present"""
-        count = self.count_pattern(filename, r'call void @abort')
+        count = self.count_pattern(content, _ABORT_CALL)
         return count > 0, count
     
-    def verify_duplicates_present(self, filename):
+    def verify_duplicates_present(self, content):
         """Check if duplicate comparisons are present"""
-        count = self.count_pattern(filename, r'%dup_\d+')
+        count = self.count_pattern(content, _DUP_RE, b'%dup_')
         return count > 0, count
     
-    def verify_verification_present(self, filename):
+    def verify_verification_present(self, content):
         """Check if verification logic is present"""
-        count = self.count_pattern(filename, r'%verify_\d+')
+        count = self.count_pattern(content, _VERIFY_RE, b'%verify_')
         return count > 0, count
     
     def compile_with_optimization(self, input_ir, output_ir, opt_level='O2'):
-        """Compile IR with optimization"""
+        """Compile IR with optimization
+        
+        output_ir is reused when it is newer than input_ir and was built at
+        the same opt_level, which is recorded in a sidecar '.opt-level' file.
+        """
         try:
+            stamp_file = output_ir + '.opt-level'
+            if os.path.exists(output_ir) and os.stat(output_ir).st_mtime > os.stat(input_ir).st_mtime:
+                with contextlib.suppress(FileNotFoundError), open(stamp_file, 'r') as f:
+                    if f.read() == opt_level:
+                        print("  [✓] Using cached optimized IR")
+                        return True
+            
+            # A failed run must not leave an older stamp next to a new output
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(stamp_file)
+            
             # Use opt-14 to apply optimization passes
             cmd = [
                 'opt-14',
@@ -58,10 +106,15 @@ class ProtectionVerifier:
                 input_ir,
                 '-o', output_ir
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # stdout is unused; only stderr is kept for error reporting
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
             if result.returncode != 0:
                 print(f"[!] Optimization failed: {result.stderr}")
                 return False
+            
+            with open(stamp_file, 'w') as f:
+                f.write(opt_level)
+            print(f"  [✓] Optimized IR saved to {output_ir}")
             return True
         except Exception as e:
             print(f"[!] Error running optimizer: {e}")
@@ -70,9 +123,10 @@ class ProtectionVerifier:
     def verify_protected_ir(self, protected_ir_file):
         """Verify the protected IR has all protections"""
         print("\n[*] Verifying protected IR...")
+        content = self._load(protected_ir_file)
         
         # Check abort calls
-        has_abort, abort_count = self.verify_abort_present(protected_ir_file)
+        has_abort, abort_count = self.verify_abort_present(content)
         self.results['abort_calls_protected'] = abort_count
         
         if not has_abort:
@@ -81,7 +135,7 @@ class ProtectionVerifier:
         print(f"  [✓] Found {abort_count} abort() calls")
         
         # Check duplicates
-        has_dups, dup_count = self.verify_duplicates_present(protected_ir_file)
+        has_dups, dup_count = self.verify_duplicates_present(content)
         self.results['duplicate_cmp_protected'] = dup_count
         
         if not has_dups:
@@ -90,14 +144,14 @@ class ProtectionVerifier:
         print(f"  [✓] Found {dup_count} duplicate comparisons")
         
         # Check verification logic
-        has_verify, verify_count = self.verify_verification_present(protected_ir_file)
+        has_verify, verify_count = self.verify_verification_present(content)
         if not has_verify:
             print("  [!] ERROR: No verification checks found")
             return False
         print(f"  [✓] Found {verify_count} verification checks")
         
         # Size metrics
-        size = self.count_lines(protected_ir_file)
+        size = self.count_lines(content)
         self.results['protected_size'] = size
         
         return True
@@ -105,9 +159,10 @@ class ProtectionVerifier:
     def verify_optimized_ir(self, original_ir, optimized_ir):
         """Verify protections survived optimization"""
         print("\n[*] Verifying optimized IR...")
+        content = self._load(optimized_ir)
         
         # Check abort calls survived
-        has_abort, abort_count = self.verify_abort_present(optimized_ir)
+        has_abort, abort_count = self.verify_abort_present(content)
         self.results['abort_calls_optimized'] = abort_count
         
         if not has_abort:
@@ -118,7 +173,7 @@ class ProtectionVerifier:
         print(f"  [✓] Protection check survived: {abort_count} abort() calls remain")
         
         # Check duplicate comparisons
-        has_dups, dup_count = self.verify_duplicates_present(optimized_ir)
+        has_dups, dup_count = self.verify_duplicates_present(content)
         self.results['duplicate_cmp_optimized'] = dup_count
         
         if dup_count == 0:
@@ -128,7 +183,7 @@ class ProtectionVerifier:
             print(f"  [✓] {dup_count} duplicate comparisons survived")
         
         # Size metrics
-        size = self.count_lines(optimized_ir)
+        size = self.count_lines(content)
         self.results['optimized_size'] = size
         
         return True
@@ -139,7 +194,7 @@ class ProtectionVerifier:
         print("VERIFICATION SUMMARY")
         print("="*60)
         
-        orig_size = self.count_lines(original_ir)
+        orig_size = self.count_lines(self._load(original_ir))
         self.results['original_size'] = orig_size
         prot_size = self.results['protected_size']
         opt_size = self.results['optimized_size']
@@ -172,6 +227,7 @@ class ProtectionVerifier:
     def run_verification(self, original_ir, protected_ir):
         """Run complete verification pipeline"""
         print("[*] Starting protection verification...")
+        self._file_cache.clear()
         
         # Step 1: Verify protected IR
         if not self.verify_protected_ir(protected_ir):
@@ -182,7 +238,6 @@ class ProtectionVerifier:
         print(f"\n[*] Compiling with -O2 optimization...")
         if not self.compile_with_optimization(protected_ir, optimized_ir, 'O2'):
             return False
-        print(f"  [✓] Optimized IR saved to {optimized_ir}")
         
         # Step 3: Verify optimized IR
         if not self.verify_optimized_ir(original_ir, optimized_ir):
@@ -192,18 +247,43 @@ class ProtectionVerifier:
         self.print_summary(original_ir)
         
         return self.results['verification_passed']
+    
+    @staticmethod
+    def run_batch(pairs):
+        """Verify independent (original, protected) IR pairs in parallel
+        
+        Each pair runs in its own process with a fresh verifier. Reports are
+        captured per worker and printed here in input order; the list of
+        per-pair results dicts is returned in the same order.
+        """
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            outcomes = list(executor.map(_verify_pair, pairs))
+        
+        for _, report in outcomes:
+            sys.stdout.write(report)
+        return [results for results, _ in outcomes]
+
+def _verify_pair(pair):
+    """Worker for run_batch: full verification of one IR pair, with its report captured"""
+    verifier = ProtectionVerifier()
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        verifier.run_verification(*pair)
+    return verifier.results, report.getvalue()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 verify_protection.py original.ll protected.ll")
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python3 verify_protection.py original.ll protected.ll [original2.ll protected2.ll ...]")
         print("\nExample:")
         print("  python3 verify_protection.py tests/inputs/password.ll tests/outputs/password_protected.ll")
         sys.exit(1)
     
-    original_ir = sys.argv[1]
-    protected_ir = sys.argv[2]
+    pairs = list(zip(sys.argv[1::2], sys.argv[2::2]))
     
-    verifier = ProtectionVerifier()
-    success = verifier.run_verification(original_ir, protected_ir)
+    if len(pairs) == 1:
+        verifier = ProtectionVerifier()
+        success = verifier.run_verification(*pairs[0])
+    else:
+        success = all(r['verification_passed'] for r in ProtectionVerifier.run_batch(pairs))
     
     sys.exit(0 if success else 1)
@@ -0,0 +1,29 @@
+// Register names like %7 and block labels repeat in every function of the
+// IR, so comparisons must be matched to branches within their own function.
+int clamp_limit(int value) {
+    int limit = 100;
+    if (value > limit) {
+        return limit;
+    }
+    return value;
+}
+
+int check_password(int input) {
+    int secret = 1234;
+    if (input == secret) {
+        return 1;
+    }
+    return 0;
+}
+
+int same_level(int a, int b) {
+    return a == b;
+}
+
+int check_pin(int input) {
+    int pin = 4321;
+    if (input == pin) {
+        return 1;
+    }
+    return 0;
+}
@@ -0,0 +1,106 @@
+; ModuleID = 'tests/inputs/multi_function.c'
+source_filename = "tests/inputs/multi_function.c"
+target datalayout = "e-m:e-p270:32:32-p271:32:32-p272:64:64-i64:64-f80:128-n8:16:32:64-S128"
+target triple = "x86_64-pc-linux-gnu"
+
+; Function Attrs: noinline nounwind optnone uwtable
+define dso_local i32 @clamp_limit(i32 noundef %0) #0 {
+  %2 = alloca i32, align 4
+  %3 = alloca i32, align 4
+  %4 = alloca i32, align 4
+  store i32 %0, i32* %3, align 4
+  store i32 100, i32* %4, align 4
+  %5 = load i32, i32* %3, align 4
+  %6 = load i32, i32* %4, align 4
+  %7 = icmp sgt i32 %5, %6
+  br i1 %7, label %8, label %10
+
+8:                                                ; preds = %1
+  %9 = load i32, i32* %4, align 4
+  store i32 %9, i32* %2, align 4
+  br label %12
+
+10:                                               ; preds = %1
+  %11 = load i32, i32* %3, align 4
+  store i32 %11, i32* %2, align 4
+  br label %12
+
+12:                                               ; preds = %10, %8
+  %13 = load i32, i32* %2, align 4
+  ret i32 %13
+}
+
+; Function Attrs: noinline nounwind optnone uwtable
+define dso_local i32 @check_password(i32 noundef %0) #0 {
+  %2 = alloca i32, align 4
+  %3 = alloca i32, align 4
+  %4 = alloca i32, align 4
+  store i32 %0, i32* %3, align 4
+  store i32 1234, i32* %4, align 4
+  %5 = load i32, i32* %3, align 4
+  %6 = load i32, i32* %4, align 4
+  %7 = icmp eq i32 %5, %6
+  br i1 %7, label %8, label %9
+
+8:                                                ; preds = %1
+  store i32 1, i32* %2, align 4
+  br label %10
+
+9:                                                ; preds = %1
+  store i32 0, i32* %2, align 4
+  br label %10
+
+10:                                               ; preds = %9, %8
+  %11 = load i32, i32* %2, align 4
+  ret i32 %11
+}
+
+; Function Attrs: noinline nounwind optnone uwtable
+define dso_local i32 @same_level(i32 noundef %0, i32 noundef %1) #0 {
+  %3 = alloca i32, align 4
+  %4 = alloca i32, align 4
+  store i32 %0, i32* %3, align 4
+  store i32 %1, i32* %4, align 4
+  %5 = load i32, i32* %3, align 4
+  %6 = load i32, i32* %4, align 4
+  %7 = icmp eq i32 %5, %6
+  %8 = zext i1 %7 to i32
+  ret i32 %8
+}
+
+; Function Attrs: noinline nounwind optnone uwtable
+define dso_local i32 @check_pin(i32 noundef %0) #0 {
+  %2 = alloca i32, align 4
+  %3 = alloca i32, align 4
+  %4 = alloca i32, align 4
+  store i32 %0, i32* %3, align 4
+  store i32 4321, i32* %4, align 4
+  %5 = load i32, i32* %3, align 4
+  %6 = load i32, i32* %4, align 4
+  %7 = icmp eq i32 %5, %6
+  br i1 %7, label %8, label %9
+
+8:                                                ; preds = %1
+  store i32 1, i32* %2, align 4
+  br label %10
+
+9:                                                ; preds = %1
+  store i32 0, i32* %2, align 4
+  br label %10
+
+10:                                               ; preds = %9, %8
+  %11 = load i32, i32* %2, align 4
+  ret i32 %11
+}
+
+attributes #0 = { noinline nounwind optnone uwtable "frame-pointer"="all" "min-legal-vector-width"="0" "no-trapping-math"="true" "stack-protector-buffer-size"="8" "target-cpu"="x86-64" "target-features"="+cx8,+fxsr,+mmx,+sse,+sse2,+x87" "tune-cpu"="generic" }
+
+!llvm.module.flags = !{!0, !1, !2, !3, !4}
+!llvm.ident = !{!5}
+
+!0 = !{i32 1, !"wchar_size", i32 4}
+!1 = !{i32 7, !"PIC Level", i32 2}
+!2 = !{i32 7, !"PIE Level", i32 2}
+!3 = !{i32 7, !"uwtable", i32 1}
+!4 = !{i32 7, !"frame-pointer", i32 2}
+!5 = !{!"Ubuntu clang version 14.0.6"}